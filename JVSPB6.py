@@ -1,11 +1,15 @@
 import streamlit as st
-from PyPDF2 import PdfMerger
+from PyPDF2 import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfbase import pdfmetrics
 from reportlab.lib.utils import ImageReader
 from datetime import datetime
-import tempfile, os
+from array import array
+from functools import lru_cache
+from collections import deque
+from io import BytesIO
+import os
 
 # ---------- Drag & drop ordering (with fallback) ----------
 def _get_sort_labels_fn():
@@ -38,7 +42,23 @@ def _get_sort_labels_fn():
 
 sort_labels = _get_sort_labels_fn()
 
+# ---------- Font metrics ----------
+# Helvetica advance widths at 1pt for chars 0..127, so title fitting can sum
+# a table lookup per char instead of going through pdfmetrics every rerun.
+HELV_W = array("d", [pdfmetrics.stringWidth(chr(i), "Helvetica", 1.0) for i in range(128)])
+
+# Ascent/descent normalized to 1pt (ReportLab reports 1000-em units)
+_ASC = {"Helvetica": pdfmetrics.getAscent("Helvetica") / 1000.0}
+_DES = {"Helvetica": abs(pdfmetrics.getDescent("Helvetica") / 1000.0)}
+
+def _ascii_width_1pt(txt, font_name="Helvetica"):
+    """Width of txt at 1pt; sums HELV_W for all-ASCII Helvetica text, pdfmetrics otherwise."""
+    if font_name == "Helvetica" and txt.isascii():
+        return sum(map(HELV_W.__getitem__, txt.encode("ascii")))
+    return pdfmetrics.stringWidth(txt, font_name, 1.0)
+
 # ---------- Helpers ----------
+@lru_cache(maxsize=32)
 def hex_to_rgb01(hex_color: str):
     h = hex_color.strip().lstrip("#")
     r = int(h[0:2], 16) / 255.0
@@ -46,6 +66,10 @@ def hex_to_rgb01(hex_color: str):
     b = int(h[4:6], 16) / 255.0
     return r, g, b
 
+# Cover colors, parsed once at import
+_BORDER_RGB = hex_to_rgb01("#D9D9D9")   # light gray border
+_BAR_RGB    = hex_to_rgb01("#BC141B")   # red bar
+
 def fit_multiline_text(lines, font_name, bar_width, bar_height,
                        side_pad=48, v_pad=18,
                        max_pt=36, min_pt=14,
@@ -54,6 +78,16 @@ def fit_multiline_text(lines, font_name, bar_width, bar_height,
     Compute a single font size (applied to all lines) and matching leading
     that fit within the red bar's width/height after padding.
     """
+    sizes, leading = _fit_cached(
+        tuple(lines), font_name, bar_width, bar_height,
+        side_pad, v_pad, max_pt, min_pt, leading_factor, letter_spacing,
+    )
+    return list(sizes), leading
+
+@lru_cache(maxsize=64)
+def _fit_cached(lines, font_name, bar_width, bar_height, side_pad, v_pad,
+                max_pt, min_pt, leading_factor, letter_spacing):
+    """Memoized body of fit_multiline_text; `lines` must be a tuple. Returns (sizes tuple, leading)."""
     # Safe drawing box inside the bar
     safe_w = max(bar_width - 2*side_pad, 1)
     safe_h = max(bar_height - 2*v_pad, 1)
@@ -63,7 +97,7 @@ def fit_multiline_text(lines, font_name, bar_width, bar_height,
     for txt in lines:
         if not txt:
             continue
-        base_w_at_1pt = pdfmetrics.stringWidth(txt, font_name, 1.0)
+        base_w_at_1pt = _ascii_width_1pt(txt, font_name)
         # letter_spacing is absolute points (not scaled by size)
         extra = letter_spacing * max(len(txt) - 1, 0)
         unit_w = base_w_at_1pt  # we'll keep letter_spacing=0 for titles by default
@@ -71,18 +105,29 @@ def fit_multiline_text(lines, font_name, bar_width, bar_height,
             caps.append(safe_w / unit_w)
     width_cap = min(caps) if caps else max_pt
 
-    # Height cap: total stack height must fit (N-1) * leading
+    # Height cap (already clamped to max_pt): total stack height must fit (N-1) * leading
     n = len(lines)
-    height_cap = (safe_h / ((n - 1) * leading_factor)) if n > 1 else max_pt
+    cap = max_pt if n <= 1 else min(safe_h / ((n - 1) * leading_factor), max_pt)
 
-    size = max(min(width_cap, height_cap, max_pt), min_pt)
+    size = max(min(width_cap, cap), min_pt)
     leading = size * leading_factor
-    return [size] * n, leading
+    return (size,) * n, leading
 
-def draw_logo_centered_between_page_top_and_bar_top(c, logo_path, max_width, page_width, page_height, bar_top_y):
-    """Draw logo centered horizontally, vertically centered between page top and top of the red bar."""
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_logo(logo_path: str, mtime: float):
+    """Decode the logo once per (path, mtime); returns (ImageReader, (width, height))."""
     img = ImageReader(logo_path)
-    iw, ih = img.getSize()
+    # Decode up front: the reader is shared across sessions, so don't leave the
+    # lazy first decode of the RGB plane (or, for RGBA, the soft mask that
+    # getRGBData creates) to whichever request draws it first.
+    img.getRGBData()
+    if img._dataA:
+        img._dataA.getRGBData()
+    return img, img.getSize()
+
+def draw_logo_centered_between_page_top_and_bar_top(c, logo, max_width, page_width, page_height, bar_top_y):
+    """Draw logo centered horizontally, vertically centered between page top and top of the red bar."""
+    img, (iw, ih) = logo
     scale = min(max_width / iw, 1.0)
     w = iw * scale
     h = ih * scale
@@ -90,7 +135,7 @@ def draw_logo_centered_between_page_top_and_bar_top(c, logo_path, max_width, pag
     desired_center_y = (page_height + bar_top_y) / 2.0
     y = desired_center_y - (h / 2.0)
     y = min(y, page_height - h - 24)
-    c.drawImage(logo_path, x, y, width=w, height=h, preserveAspectRatio=True, mask='auto')
+    c.drawImage(img, x, y, width=w, height=h, preserveAspectRatio=True, mask='auto')
     return h
 
 def draw_centered_stack(
@@ -104,9 +149,9 @@ def draw_centered_stack(
     if not lines:
         return
 
-    # Font metrics (ReportLab returns 1000-em units; scale by point size)
-    asc_u = pdfmetrics.getAscent(font_name) / 1000.0
-    des_u = abs(pdfmetrics.getDescent(font_name) / 1000.0)
+    # Font metrics at 1pt (cached for Helvetica; scale by point size)
+    asc_u = _ASC.get(font_name) or pdfmetrics.getAscent(font_name) / 1000.0
+    des_u = _DES.get(font_name) or abs(pdfmetrics.getDescent(font_name) / 1000.0)
 
     asc0      = asc_u * sizes[0]          # ascent of first line
     des_last  = des_u * sizes[-1]         # descent of last line
@@ -126,7 +171,7 @@ def draw_centered_stack(
         if letter_spacing and letter_spacing > 0:
             # Center with tracking: widen width by char spacing * number of gaps
             n_gaps = max(len(txt) - 1, 0)
-            base_w = pdfmetrics.stringWidth(txt, font_name, sz)
+            base_w = _ascii_width_1pt(txt, font_name) * sz
             w = base_w + letter_spacing * n_gaps
             x_left = x_center - (w / 2.0)
 
@@ -162,24 +207,22 @@ def date_or_tbc(label: str, key: str, unknown_label: str | None = None):
     return None if st.session_state.get(unknown_key, False) else date_val
 
 # --- helper: mutually-exclusive checkboxes for role selection ---
-def role_checkbox_group(key_prefix="role"):
-    roles = ["Contractor", "Engineer", "Distributor", "Utility"]
-    keys = [f"{key_prefix}_{r.lower()}" for r in roles]
+_ROLES = ("Contractor", "Engineer", "Distributor", "Utility")
+_ROLE_KEYS = {r: f"aud_{r.lower()}" for r in _ROLES}   # role -> session_state key
 
+def role_checkbox_group():
     def _set_only(this_key):
-        for k in keys:
+        for k in _ROLE_KEYS.values():
             if k != this_key:
                 st.session_state[k] = False
 
-    cols = st.columns(len(roles))
-    for r, k, col in zip(roles, keys, cols):
+    cols = st.columns(len(_ROLES))
+    for (r, k), col in zip(_ROLE_KEYS.items(), cols):
         with col:
             st.checkbox(r, key=k, on_change=_set_only, args=(k,))
 
-    for r, k in zip(roles, keys):
-        if st.session_state.get(k):
-            return r
-    return None  # nothing selected yet
+    # nothing selected yet -> None
+    return next((r for r, k in _ROLE_KEYS.items() if st.session_state.get(k)), None)
 
 # --- helper: Bid Date with two *mutually exclusive* flags (TBC / Not Applicable) ---
 def bid_date_picker_with_flags(label: str, key: str):
@@ -221,7 +264,7 @@ def bid_date_picker_with_flags(label: str, key: str):
     return date_val, tbc_state, na_state
 
 def make_cover_pdf(
-    outfile: str,
+    outfile,
     logo_path: str,
     project_name: str,
     project_location: str,
@@ -242,12 +285,11 @@ def make_cover_pdf(
     # ---- Light gray inner border ----
     border_inset = 36
     c.setLineWidth(1)
-    c.setStrokeColorRGB(*hex_to_rgb01("#D9D9D9"))
+    c.setStrokeColorRGB(*_BORDER_RGB)
     c.rect(border_inset, border_inset, width - 2*border_inset, height - 2*border_inset, stroke=1, fill=0)
 
     # ---- Red bar ----
-    BAR_COLOR  = "#BC141B"
-    bar_rgb    = hex_to_rgb01(BAR_COLOR)
+    bar_rgb    = _BAR_RGB
     bar_height = 140
     bar_y      = (height / 2.0) - (bar_height / 2.0)
     bar_top_y  = bar_y + bar_height
@@ -259,8 +301,9 @@ def make_cover_pdf(
     # ---- Logo: centered between page top and bar top ----
     if logo_path and os.path.exists(logo_path):
         try:
+            logo = get_logo(logo_path, os.path.getmtime(logo_path))
             draw_logo_centered_between_page_top_and_bar_top(
-                c, logo_path, max_width=300,
+                c, logo, max_width=300,
                 page_width=width, page_height=height, bar_top_y=bar_top_y
             )
         except Exception as e:
@@ -307,14 +350,15 @@ def make_cover_pdf(
 
     date_prep_txt = format_mdY(date_prepared, blank="To Be Confirmed").upper()
 
-    lines_bottom = [first_line, f"DATE PREPARED: {date_prep_txt}"]
-
     # BID DATE handling
-    if not bid_date_na:
-        if bid_date_tbc or not bid_date:
-            lines_bottom.append("BID DATE: TO BE CONFIRMED")
-        else:
-            lines_bottom.append(f"BID DATE: {format_mdY(bid_date).upper()}")
+    if bid_date_na:
+        bid_lines = ()
+    elif bid_date_tbc or not bid_date:
+        bid_lines = ("BID DATE: TO BE CONFIRMED",)
+    else:
+        bid_lines = (f"BID DATE: {format_mdY(bid_date).upper()}",)
+
+    lines_bottom = (first_line, f"DATE PREPARED: {date_prep_txt}") + bid_lines
 
     draw_centered_stack(
         c,
@@ -330,6 +374,37 @@ def make_cover_pdf(
     c.showPage()
     c.save()
 
+# Bounded: every distinct set of cover inputs keeps a ~37 KB PDF for the whole
+# process. Note that make_cover_pdf's st.warning calls are replayed on cache hits.
+@st.cache_data(show_spinner=False, max_entries=32)
+def cover_bytes(
+    logo_key,
+    project_name: str,
+    project_location: str,
+    party_label: str,
+    party_name: str,
+    date_prepared,
+    bid_date,
+    bid_date_tbc: bool = False,
+    bid_date_na: bool = False,
+) -> bytes:
+    """Cover page PDF as bytes, cached on its inputs. logo_key is (logo_path, mtime)."""
+    logo_path, _ = logo_key
+    buf = BytesIO()
+    make_cover_pdf(
+        buf,
+        logo_path=logo_path,
+        project_name=project_name,
+        project_location=project_location,
+        party_label=party_label,
+        party_name=party_name,
+        date_prepared=date_prepared,
+        bid_date=bid_date,
+        bid_date_tbc=bid_date_tbc,
+        bid_date_na=bid_date_na,
+    )
+    return buf.getvalue()
+
 # ---------- Streamlit UI ----------
 st.title("Jomar Valve Submittal Package Builder")
 st.caption("Select multiple PDF spec sheets to generate a combined PDF with a custom cover page")
@@ -337,7 +412,7 @@ st.caption("Select multiple PDF spec sheets to generate a combined PDF with a cu
 uploaded_files = st.file_uploader("Select PDF spec sheets", type="pdf", accept_multiple_files=True)
 
 # Role selection (mutually-exclusive checkboxes) — no header
-selected_role = role_checkbox_group(key_prefix="aud")
+selected_role = role_checkbox_group()
 
 # Text input directly under the checkboxes for the name/company
 party_name = st.text_input("Company", "")
@@ -374,15 +449,14 @@ if uploaded_files:
     # Map the sorted names back to UploadedFile objects (handles duplicates)
     label_to_idxs = {}
     for i, lbl in enumerate(labels):
-        label_to_idxs.setdefault(lbl, []).append(i)
-    ordered_files = [uploaded_files[label_to_idxs[lbl].pop(0)] for lbl in ordered_labels]
+        label_to_idxs.setdefault(lbl, deque()).append(i)
+    ordered_files = [uploaded_files[label_to_idxs[lbl].popleft()] for lbl in ordered_labels]
 
 # ---- Generate ----
 if uploaded_files and st.button("Generate Combined PDF"):
-    cover_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    make_cover_pdf(
-        cover_tmp.name,
-        logo_path=default_logo_path,
+    logo_mtime = os.path.getmtime(default_logo_path) if os.path.exists(default_logo_path) else None
+    cover = cover_bytes(
+        (default_logo_path, logo_mtime),
         project_name=project_name,
         project_location=project_location,
         party_label=selected_role,   # role (may be None)
@@ -395,19 +469,18 @@ if uploaded_files and st.button("Generate Combined PDF"):
 
     final_files = ordered_files or uploaded_files
 
-    merger = PdfMerger()
-    merger.append(cover_tmp.name)
+    writer = PdfWriter()
+    writer.append(BytesIO(cover))
     for uf in final_files:
-        merger.append(uf)
-
-    out_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    merger.write(out_tmp.name)
-    merger.close()
-
-    with open(out_tmp.name, "rb") as f:
-        st.download_button(
-            "Download Combined PDF",
-            f,
-            file_name="Combined_Spec_Sheets.pdf",
-            mime="application/pdf"
-        )
+        writer.append(PdfReader(uf, strict=False))
+
+    out_buf = BytesIO()
+    writer.write(out_buf)
+    writer.close()
+
+    st.download_button(
+        "Download Combined PDF",
+        out_buf.getvalue(),
+        file_name="Combined_Spec_Sheets.pdf",
+        mime="application/pdf"
+    )